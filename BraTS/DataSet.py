@@ -136,6 +136,15 @@ class DataSubSet:
         self._patients[patient_id] = patient  # cache the value for later
         return patient
 
+    def drop_patient(self, patient_id):
+        """
+        Drops a single patient from the cache, leaving all other cached patients
+
+        :param patient_id: The patient ID
+        :return: None
+        """
+        self._patients.pop(patient_id, None)
+
     def drop_cache(self):
         self._patients.clear()
         self._mris = None
@@ -28,5 +28,22 @@ class BraTSTest(unittest.TestCase):
         self.assertIsInstance(patient.seg, np.ndarray)
 
 
+class DataSubSetCacheTest(unittest.TestCase):
+
+    def test_drop_patient(self):
+        # Only the cache is touched so no data needs to be on disk
+        subset = BraTS.DataSubSet({"a": "/a", "b": "/b"}, survival_csv=None)
+        subset._patients["a"] = BraTS.Patient("a")
+        subset._patients["b"] = BraTS.Patient("b")
+
+        subset.drop_patient("a")
+        self.assertNotIn("a", subset._patients)
+        self.assertIn("b", subset._patients)
+
+        # Dropping a patient that isn't cached does nothing
+        subset.drop_patient("a")
+        self.assertEqual(list(subset._patients), ["b"])
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
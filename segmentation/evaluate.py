@@ -14,34 +14,56 @@ import os
 import sys
 import argparse
 import logging
+import itertools
+import multiprocessing
+import collections
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import tensorflow as tf
+from tensorflow.python.client import timeline
 
 import BraTS
 from BraTS.Patient import Patient
+from BraTS.modalities import mri_shape
 from segmentation.config import Configuration
 from preprocessing.partitions import get_all_partition_ids
-import random
 
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+import matplotlib.image
 from matplotlib.colors import Normalize
 
 logger = logging.getLogger()
 
+# Segmentation overlay color map and normalization
+_seg_cmap = plt.cm.RdYlBu
+_seg_norm = Normalize(vmin=0, vmax=1, clip=True)
+
+# Figure that is reused between images, created on first use
+_figure = None
+_axes = None
+
+# Rendered images are encoded and written to disk in the background.
+# At most _max_pending_writes images are held in memory awaiting writing.
+_image_writer = ThreadPoolExecutor(max_workers=4)
+_pending_writes = collections.deque()
+_max_pending_writes = 16
+
 
 def dice_coefficient(pred, truth, smooth=0.02):
-    _pred = np.ravel(pred)
-    _truth = np.ravel(truth)
-    intersection = np.logical_and(_pred, _truth)
-    return (2 * intersection.sum() + smooth) / (pred.sum() + truth.sum() + smooth)
+    # Counting non-zeros of bool masks is much faster than summing
+    # the original arrays, which also has to convert them
+    _pred = np.ravel(pred).astype(bool, copy=False)
+    _truth = np.ravel(truth).astype(bool, copy=False)
+    intersection = np.count_nonzero(_pred & _truth)
+    return (2 * intersection + smooth) / (np.count_nonzero(_pred) + np.count_nonzero(_truth) + smooth)
 
 
 def to_single_class(seg, threshold):
-    _seg = np.copy(seg)
-    _seg[seg >= threshold] = 1
-    _seg[seg < threshold] = 0
-    return _seg.astype(int)
+    # Single thresholding pass straight into a uint8 mask
+    return np.greater_equal(seg, threshold).view(np.uint8)
 
 
 def make_dice_histogram(dice_coefficients, filename):
@@ -50,6 +72,8 @@ def make_dice_histogram(dice_coefficients, filename):
 
 
 def _crop(image):
+    # Drops the first three slices of the last axis so that it is 152 long
+    # and easily divisible by powers of two. This is a view, not a copy.
     image = image[..., 3:]
     return image
 
@@ -59,46 +83,71 @@ def get_tumor_range(patient):
     Finds where the tumor exists in a patient's images
 
     :param patient: Patient object containing the MRI/segmentation
-    :return: Returns a list of indices in the last axis
-    of the patient MRI/Segmentation that contain the tumor
+    :return: Tuple containing an array of indices in the last axis
+    of the patient MRI/Segmentation that contain the tumor, and an
+    array of the total segmentation value at each of those indices
     """
     assert isinstance(patient, Patient)
-    tumor_range = list()
-    for i in range(patient.seg.shape[3]):
-        if np.sum(patient.seg[:, :, i]) != 0:
-            tumor_range.append(i)
-    return tumor_range
+    sums = patient.seg.sum(axis=tuple(range(patient.seg.ndim - 1)))
+    tumor_range = np.flatnonzero(sums)
+    return tumor_range, sums[tumor_range]
 
 
-def make_image(patient, segmentation, coronal_index, dice, output_dir):
-    _img = patient.flair[:, coronal_index, :].T[::-1, :]
-    _seg = to_single_class(patient.seg, threshold=0.5)[:, coronal_index, :].T[::-1, :]
+def _get_figure():
+    # Constructing a figure is far more expensive than
+    # clearing one, so the same figure is reused for every image
+    global _figure, _axes
+    if _figure is None:
+        _figure, _axes = plt.subplots(1, 2)
+    for ax in _axes:
+        ax.clear()
+    return _figure, _axes
+
 
-    vmax = 1
-    vmin = 0
-    cmap = plt.cm.RdYlBu
+def _overlay_colors(seg):
+    colors = _seg_cmap(_seg_norm(seg))
+    colors[..., -1] = seg
+    return colors
 
-    colors = Normalize(vmin, vmax, clip=True)(_seg)
-    colors = cmap(colors)
-    colors[..., -1] = _seg
 
-    fig, axarr = plt.subplots(1, 2)
+def make_image(patient, segmentation, coronal_index, dice, output_dir):
+    _img = patient.flair[:, coronal_index, :].T[::-1, :]
+    _seg = to_single_class(patient.seg[:, coronal_index, :], threshold=0.5).T[::-1, :]
+    _pred = np.squeeze(segmentation)[:, coronal_index, :].T[::-1, :]
+
+    fig, axarr = _get_figure()
     axarr[0].set_title("Subject: %s" % patient.id)
     axarr[0].imshow(_img, cmap='gray')
-    axarr[0].imshow(colors)
+    axarr[0].imshow(_overlay_colors(_seg))
     axarr[0].set_axis_off()
 
-    colors_p = Normalize(vmin, vmax, clip=True)(segmentation)
-    colors_p = cmap(colors)
-    colors_p[..., -1] = segmentation
-
     axarr[1].set_title("UNet Prediction, dice: %f" % dice)
     axarr[1].imshow(_img, cmap='gray')
-    axarr[1].imshow(colors_p)
+    axarr[1].imshow(_overlay_colors(_pred))
     axarr[1].set_axis_off()
 
     out_file = os.path.join(output_dir, "%s_%d.png" % (patient.id, coronal_index))
-    fig.savefig(out_file)
+    _write_image_async(fig, out_file)
+
+
+def _write_image_async(fig, out_file):
+    # Renders the figure now, since it will be reused for the next
+    # image, but leaves PNG encoding and writing to the writer threads
+    fig.canvas.draw()
+    pixels = np.array(fig.canvas.buffer_rgba())
+
+    while len(_pending_writes) >= _max_pending_writes:
+        _pending_writes.popleft().result()
+    _pending_writes.append(_image_writer.submit(matplotlib.image.imsave, out_file, pixels))
+
+
+def wait_for_image_writes():
+    """
+    Blocks until all images queued by make_image have been written
+    :return: None
+    """
+    while _pending_writes:
+        _pending_writes.popleft().result()
 
 
 def make_images(patient, predicted_seg, output_directory, dice, num_images=5):
@@ -106,17 +155,21 @@ def make_images(patient, predicted_seg, output_directory, dice, num_images=5):
     assert isinstance(predicted_seg, np.ndarray)
     assert isinstance(output_directory, str)
 
-    tumor_range = get_tumor_range(patient)
+    tumor_range, weights = get_tumor_range(patient)
 
     # Select some slices randomly weighted based on how much tumor is present
-    weights = [np.sum(patient.seg[:, :, i]) for i in tumor_range]
-    coronal_slices = sorted(random.choices(tumor_range, weights=weights, k=num_images))
+    coronal_slices = np.sort(np.random.choice(tumor_range, size=num_images, replace=True,
+                                              p=weights / weights.sum()))
 
     for coronal_index in coronal_slices:
         make_image(patient, predicted_seg, coronal_index, dice, output_directory)
 
 
 def log_metrics(dice_coefficients, name):
+    if len(dice_coefficients) == 0:
+        logger.warning("%s evaluation has no dice coefficients, skipping stats." % name)
+        return
+
     mean_dice = np.mean(dice_coefficients)
     std_dice = np.std(dice_coefficients)
     min_dice = np.min(dice_coefficients)
@@ -129,79 +182,332 @@ def log_metrics(dice_coefficients, name):
     logger.info("max dice: %s" % max_dice)
 
 
-def make_histograms_and_images(run_model, patient_ids, output_dir, name="unnamed"):
+def _batches(iterable, batch_size):
+    # Yields successive lists of at most batch_size items
+    iterator = iter(iterable)
+    batch = list(itertools.islice(iterator, batch_size))
+    while batch:
+        yield batch
+        batch = list(itertools.islice(iterator, batch_size))
 
-    brats = BraTS.DataSet(brats_root=config.brats_directory, year=2018)
 
+def _prefetch_patients(data_subset, patient_ids, num_prefetch=1):
+    """
+    Loads patients from disk in background threads
+
+    Each patient is about 360 MB in memory (float64 MRI and segmentation),
+    and up to num_prefetch patients are held on top of those the consumer holds.
+
+    :param data_subset: BraTS DataSubSet to load patients from
+    :param patient_ids: Iterable of patient IDs to load
+    :param num_prefetch: Number of patients to load ahead of the consumer
+    :return: Generator yielding Patient objects in the order of patient_ids
+    """
+    with ThreadPoolExecutor(max_workers=num_prefetch) as executor:
+        pending = collections.deque()
+        for id in patient_ids:
+            pending.append(executor.submit(data_subset.patient, id))
+            if len(pending) > num_prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def make_batch_buffer(batch_size):
+    """
+    Allocates a buffer to assemble batches of MRIs in
+
+    :param batch_size: The maximum number of MRIs per batch
+    :return: Uninitialized float32 array with room for batch_size MRIs
+    """
+    return np.empty((batch_size,) + mri_shape, dtype=np.float32)
+
+
+def get_segmentation(run_model, mris, batch_buffer=None):
+    """
+    Runs the model on a batch of patient MRIs
+
+    :param run_model: Function which runs the model on a batch of MRIs
+    :param mris: List of patient MRIs. The model normalizes with the moments of
+    each batch, so predictions depend on which MRIs are batched together.
+    :param batch_buffer: Buffer from make_batch_buffer to assemble the batch
+    in. If not provided, a new buffer is allocated for this batch.
+    :return: List of predicted single-class segmentations, one per MRI
+    """
+    # Stacks the patient MRIs into a single batch so that the model
+    # is run once per batch and then splits the output per patient.
+    # The batch is built directly in float32, the model's input type,
+    # so that feeding it does not require another conversion. Cropping
+    # happens inside the graph (see _restore_model).
+    if batch_buffer is None:
+        batch_buffer = make_batch_buffer(len(mris))
+    batch = batch_buffer[:len(mris)]
+    for i, mri in enumerate(mris):
+        np.copyto(batch[i], mri)
+    out = run_model(batch)  # already thresholded by the graph
+    return [out[i] for i in range(len(mris))]
+
+
+def evaluate_patient(patient, pred, output_dir):
+    """
+    Scores a single patient's predicted segmentation and makes images of it
+
+    :param patient: Patient object containing the MRI/segmentation
+    :param pred: The predicted segmentation for the patient
+    :param output_dir: Directory to store the images in
+    :return: The dice coefficient of the prediction
+    """
+    # The ground truth is label-valued (0 is background) so it doesn't need
+    # thresholding, dice_coefficient treats every non-zero label as tumor
+    truth = _crop(patient.seg)
+    dice = dice_coefficient(pred, truth)
+
+    logger.info("Patient: %s, dice coefficient: %s" % (patient.id, dice))
+    make_images(patient, pred, output_dir, dice)
+    return dice
+
+
+def _make_output_dir(output_dir, name):
     out_dir = os.path.join(output_dir, name)
     try:
         os.mkdir(out_dir)
     except:
         pass
+    return out_dir
 
-    def get_segmentation(mri):
-        # Formats the patient MRI so that it can be
-        # fed into the model and then formats the output
-        _mri = np.expand_dims(mri, axis=0)
-        out = run_model(_crop(_mri))
-        pred_seg = to_single_class(out, threshold=0.5)
-        return pred_seg
 
-    dice_coefficients = list()
-    for id in patient_ids:
-        patient = brats.train.patient(id)
-
-        pred = get_segmentation(patient.mri)
-        truth = to_single_class(_crop(patient.seg), threshold=0.5)
-        dice = dice_coefficient(pred, truth)
+def make_histograms_and_images(run_model, brats, patient_ids, output_dir, name="unnamed", batch_size=1):
 
-        logger.info("Patient: %s, dice coefficient: %s" % (id, dice))
-        dice_coefficients.append(dice)
-        make_images(patient, pred, out_dir, dice)
-        brats.drop_cache()
+    assert isinstance(brats, BraTS.DataSet)
+    out_dir = _make_output_dir(output_dir, name)
 
+    dice_coefficients = list()
+    # Patients are loaded in the background while the model runs, one batch
+    # ahead, so about 2 * batch_size patients are in memory at once. Only
+    # the patients that have been evaluated are dropped from the cache
+    # so that patients which have already been prefetched are kept.
+    data_subset = brats.train
+    patient_stream = _prefetch_patients(data_subset, patient_ids, num_prefetch=batch_size)
+    batch_buffer = make_batch_buffer(batch_size)
+    for patients in _batches(patient_stream, batch_size):
+        preds = get_segmentation(run_model, [patient.mri for patient in patients], batch_buffer)
+        for patient, pred in zip(patients, preds):
+            dice_coefficients.append(evaluate_patient(patient, pred, out_dir))
+            data_subset.drop_patient(patient.id)
+
+    wait_for_image_writes()
     log_metrics(dice_coefficients, name)
 
     # histogram_file = os.path.join(output_dir, "%s_hist.png" % name)
     # make_dice_histogram(dice_coefficients, histogram_file)
 
 
-def evaluate(run_model, output_dir):
+def evaluate(run_model, output_dir, batch_size=1):
 
     train_ids, test_ids, validation_ids = get_all_partition_ids()
+    brats = BraTS.DataSet(brats_root=config.brats_directory, year=2018)
 
     logger.info("Evaluating test data...")
-    make_histograms_and_images(run_model, test_ids, output_dir)
+    make_histograms_and_images(run_model, brats, test_ids, output_dir, name="test", batch_size=batch_size)
 
     logger.info("Evaluating validation data...")
-    make_histograms_and_images(run_model, validation_ids, output_dir)
+    make_histograms_and_images(run_model, brats, validation_ids, output_dir, name="validation", batch_size=batch_size)
 
     logger.info("Evaluating training data...")
-    make_histograms_and_images(run_model, train_ids, output_dir)
+    make_histograms_and_images(run_model, brats, train_ids, output_dir, name="train", batch_size=batch_size)
 
 
-def restore_and_evaluate(save_path, model_file, output_dir):
-    tf.reset_default_graph()
+def _session_config(num_threads=None, xla=False):
+    """
+    Makes the configuration for evaluation sessions
+
+    :param num_threads: Number of threads to run each op with, defaults to
+    the number of cores available to this process
+    :param xla: Turn on XLA JIT compilation of the whole graph
+    :return: tf.ConfigProto with thread pools, memory growth and XLA configured
+    """
+    if num_threads is None:
+        num_threads = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+
+    session_config = tf.ConfigProto(intra_op_parallelism_threads=num_threads,
+                                    inter_op_parallelism_threads=2)
+    session_config.gpu_options.allow_growth = True
+    if xla:
+        session_config.graph_options.optimizer_options.global_jit_level = tf.OptimizerOptions.ON_2
+    return session_config
+
+
+def _restore_model(sess, save_path, model_file, trace_dir=None, num_traces=3):
+    """
+    Restores the model into a session
+
+    :param sess: The TensorFlow session to restore the model into
+    :param save_path: TensorFlow save path containing the checkpoints
+    :param model_file: The meta graph file of the model
+    :param trace_dir: If provided, Chrome traces of the first few model runs are saved here
+    :param num_traces: Number of model runs to trace
+    :return: Function which runs the model on a batch of MRIs and
+    returns the single-class (uint8) segmentations
+    """
+    # The model's input is re-mapped to a crop of a full-sized MRI
+    # placeholder so that the crop is done by TensorFlow, not numpy
+    mri = tf.placeholder(tf.float32, shape=(None,) + mri_shape, name="mri")
+    cropped = tf.slice(mri, begin=[0] * 4 + [3], size=[-1] * 5)
 
-    with tf.Session() as sess:
+    logger.info("Restoring model: %s" % model_file)
+    saver = tf.train.import_meta_graph(model_file, input_map={"input:0": cropped})
+    saver.restore(sess, tf.train.latest_checkpoint(save_path))
+    logger.info("Model restored.")
 
-        logger.info("Restoring model: %s" % model_file)
-        saver = tf.train.import_meta_graph(model_file)
-        saver.restore(sess, tf.train.latest_checkpoint(save_path))
-        logger.info("Model restored.")
+    graph = tf.get_default_graph()
 
-        graph = tf.get_default_graph()
+    # The output is only ever thresholded at 0.5, so it is thresholded in the
+    # graph and fetched as uint8, a quarter of the size of the float32 output
+    output = tf.cast(graph.get_tensor_by_name("output_1:0") >= 0.5, tf.uint8)
+    is_training = graph.get_tensor_by_name("Placeholder_1:0")
 
-        input = graph.get_tensor_by_name("input:0")
-        output = graph.get_tensor_by_name("output_1:0")
-        is_training = graph.get_tensor_by_name("Placeholder_1:0")
+    num_runs = 0
 
-        def run_model(mri):
-            feed_dict = {input: mri, is_training: True}
+    def run_model(batch):
+        nonlocal num_runs
+        feed_dict = {mri: batch, is_training: True}
+        if trace_dir is None or num_runs >= num_traces:
             return sess.run(output, feed_dict=feed_dict)
 
+        # Trace the run and save it for viewing in chrome://tracing
+        run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+        run_metadata = tf.RunMetadata()
+        out = sess.run(output, feed_dict=feed_dict, options=run_options, run_metadata=run_metadata)
+
+        trace = timeline.Timeline(run_metadata.step_stats).generate_chrome_trace_format()
+        trace_file = os.path.join(trace_dir, "timeline_%d.json" % num_runs)
+        with open(trace_file, 'w') as f:
+            f.write(trace)
+        logger.info("Saved model run trace: %s" % trace_file)
+        num_runs += 1
+        return out
+
+    return run_model
+
+
+def restore_and_evaluate(save_path, model_file, output_dir, batch_size=1, trace_dir=None, xla=False):
+    tf.reset_default_graph()
+
+    with tf.Session(config=_session_config(xla=xla)) as sess:
+        run_model = _restore_model(sess, save_path, model_file, trace_dir=trace_dir)
+
         logger.info("Evaluating mode...")
-        evaluate(run_model, output_dir)
+        evaluate(run_model, output_dir, batch_size=batch_size)
+
+
+def _split_cores(num_workers):
+    # Splits the cores available to this process into
+    # num_workers disjoint, contiguous sets
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+    num_workers = min(num_workers, len(cores))
+    return [cores[i * len(cores) // num_workers: (i + 1) * len(cores) // num_workers]
+            for i in range(num_workers)]
+
+
+def _evaluation_worker(cores, config_file, log_level, save_path, model_file, output_dir,
+                       batch_size, trace_dir, xla, queue, results):
+    """
+    Evaluation worker process
+
+    Pins itself to a set of cores, restores the model into its own session
+    and then evaluates batches of (partition, patient ID) pairs off of the
+    queue until it receives None.
+    """
+    # Spawned processes don't run parse_args, so logging is set up here
+    setup_logger(log_level)
+
+    global config
+    config = Configuration(config_file) if config_file is not None else Configuration()
+
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    brats = BraTS.DataSet(brats_root=config.brats_directory, year=2018)
+    tf.reset_default_graph()
+    with tf.Session(config=_session_config(len(cores), xla=xla)) as sess:
+        run_model = _restore_model(sess, save_path, model_file, trace_dir=trace_dir)
+
+        batch_buffer = make_batch_buffer(batch_size)
+        for batch in _batches(iter(queue.get, None), batch_size):
+            patients = [brats.train.patient(id) for _, id in batch]
+            preds = get_segmentation(run_model, [patient.mri for patient in patients], batch_buffer)
+            for (name, id), patient, pred in zip(batch, patients, preds):
+                dice = evaluate_patient(patient, pred, os.path.join(output_dir, name))
+                results.append((name, id, dice))
+                brats.train.drop_patient(id)
+
+    wait_for_image_writes()
+
+
+def parallel_restore_and_evaluate(save_path, model_file, output_dir, num_workers, batch_size=1,
+                                  trace_dir=None, xla=False, config_file=None, log_level="DEBUG"):
+    """
+    Evaluates the model with several worker processes, each
+    pinned to its own set of cores and running its own session
+
+    :param save_path: TensorFlow save path containing the checkpoints
+    :param model_file: The meta graph file of the model
+    :param output_dir: Output directory to store plots
+    :param num_workers: Number of worker processes to evaluate with
+    :param batch_size: Number of patients per model run in each worker
+    :param trace_dir: If provided, each worker saves traces of its first
+    model runs in its own sub-directory of this directory
+    :param xla: Turn on XLA JIT compilation in the workers' sessions
+    :param config_file: Configuration file for the workers to load
+    :param log_level: Name of the logging level for the workers
+    :return: None
+    """
+    train_ids, test_ids, validation_ids = get_all_partition_ids()
+    partitions = [("test", test_ids), ("validation", validation_ids), ("train", train_ids)]
+
+    # Workers are spawned rather than forked so that
+    # none of them inherit TensorFlow state from this process
+    ctx = multiprocessing.get_context("spawn")
+    manager = ctx.Manager()
+    results = manager.list()
+    queue = ctx.Queue()
+
+    for name, ids in partitions:
+        _make_output_dir(output_dir, name)
+        for id in ids:
+            queue.put((name, id))
+
+    core_sets = _split_cores(num_workers)
+    for _ in core_sets:
+        queue.put(None)
+
+    worker_trace_dirs = [None] * len(core_sets)
+    if trace_dir is not None:
+        worker_trace_dirs = [os.path.join(trace_dir, "worker_%d" % i) for i in range(len(core_sets))]
+        for worker_trace_dir in worker_trace_dirs:
+            os.makedirs(worker_trace_dir, exist_ok=True)
+
+    logger.info("Evaluating with %d worker processes..." % len(core_sets))
+    workers = [ctx.Process(target=_evaluation_worker,
+                           args=(cores, config_file, log_level, save_path, model_file, output_dir,
+                                 batch_size, worker_trace_dir, xla, queue, results))
+               for cores, worker_trace_dir in zip(core_sets, worker_trace_dirs)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    results = list(results)
+    manager.shutdown()
+
+    # A crashed worker (e.g. out of memory) leaves the results incomplete
+    exit_codes = [worker.exitcode for worker in workers]
+    if any(code != 0 for code in exit_codes):
+        raise RuntimeError("Evaluation worker(s) failed with exit codes %s, evaluated %d patients"
+                           % (exit_codes, len(results)))
+
+    for name, _ in partitions:
+        log_metrics([dice for partition, _, dice in results if partition == name], name)
 
 
 def main():
@@ -227,7 +533,25 @@ def main():
     if not os.path.isdir(output_dir):
         os.makedirs(output_dir, exist_ok=True)
 
-    restore_and_evaluate(save_path, model_file, output_dir)
+    if args.batch_size > 1:
+        # The model is evaluated with is_training=True and its moving batch norm
+        # statistics were never updated, so batch norm uses the moments of each
+        # batch and a patient's prediction depends on the patients batched with it
+        logger.warning("Batch size %d > 1: predictions and dice coefficients depend on "
+                       "batch composition and are not comparable with batch size 1." % args.batch_size)
+
+    trace_dir = None
+    if args.trace:
+        trace_dir = os.path.join(output_dir, "traces")
+        os.makedirs(trace_dir, exist_ok=True)
+
+    if args.workers > 1:
+        parallel_restore_and_evaluate(save_path, model_file, output_dir, args.workers,
+                                      batch_size=args.batch_size, trace_dir=trace_dir, xla=args.xla,
+                                      config_file=args.config, log_level=args.log_level)
+    else:
+        restore_and_evaluate(save_path, model_file, output_dir,
+                             batch_size=args.batch_size, trace_dir=trace_dir, xla=args.xla)
 
 
 def parse_args():
@@ -248,20 +572,43 @@ def parse_args():
     info_options = parser.add_argument_group("Info")
     info_options.add_argument("--config", required=False, type=str, help="Configuration file")
     info_options.add_argument("-params", "--params", type=str, help="Hyperparameters json file")
+    info_options.add_argument("--batch-size", type=int, default=1,
+                              help="Number of patients per model run. The next batch is loaded while one runs, "
+                                   "so about 2 x batch size patients (~360 MB each) are held in memory. "
+                                   "Batch norm uses the moments of each batch, "
+                                   "so results with a batch size above 1 are not comparable to those with 1")
+    info_options.add_argument("--workers", type=int, default=1, help="Number of evaluation processes")
+    info_options.add_argument("--xla", action='store_true', help="Use XLA JIT compilation")
 
     logging_options = parser.add_argument_group("Logging")
     logging_options.add_argument('--log', dest="log_level", default="DEBUG", help="Logging level")
+    logging_options.add_argument('--trace', action='store_true', help="Save traces of the first model runs")
 
     args = parser.parse_args()
 
-    # Setup the logger
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    setup_logger(args.log_level)
+    return args
+
+
+def setup_logger(log_level_name):
+    """
+    Sets up the console logger for this process
+
+    :param log_level_name: Name of the logging level (e.g. "DEBUG")
+    :return: None
+    """
     global logger
     logger = logging.getLogger('root')
 
     # Logging level configuration
-    log_level = getattr(logging, args.log_level.upper())
+    log_level = getattr(logging, log_level_name.upper())
     if not isinstance(log_level, int):
-        raise ValueError('Invalid log level: %s' % args.log_level)
+        raise ValueError('Invalid log level: %s' % log_level_name)
 
     log_formatter = logging.Formatter('[%(asctime)s][%(levelname)s][%(funcName)s] - %(message)s')
 
@@ -272,8 +619,6 @@ def parse_args():
 
     logger.setLevel(log_level)
 
-    return args
-
 
 if __name__ == "__main__":
     main()
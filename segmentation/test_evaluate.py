@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+File: test_evaluate
+Date: 10/14/26
+
+This file tests the numpy helpers used to evaluate segmentation models.
+None of these tests need the BraTS data-set or a trained model.
+"""
+
+import os
+import unittest
+import numpy as np
+
+from BraTS.Patient import Patient
+from segmentation.evaluate import dice_coefficient, to_single_class, get_tumor_range
+from segmentation.evaluate import _batches, _split_cores
+
+
+def _dice_reference(pred, truth, smooth=0.02):
+    # The original logical_and implementation of dice_coefficient
+    intersection = np.logical_and(np.ravel(pred), np.ravel(truth))
+    return (2 * intersection.sum() + smooth) / (pred.sum() + truth.sum() + smooth)
+
+
+def _to_single_class_reference(seg, threshold):
+    # The original copy and mask implementation of to_single_class
+    _seg = np.copy(seg)
+    _seg[seg >= threshold] = 1
+    _seg[seg < threshold] = 0
+    return _seg.astype(int)
+
+
+def _tumor_range_reference(seg):
+    # The original per-slice loop of get_tumor_range, over the last axis
+    tumor_range = [i for i in range(seg.shape[-1]) if np.sum(seg[..., i]) != 0]
+    weights = [np.sum(seg[..., i]) for i in tumor_range]
+    return tumor_range, weights
+
+
+class EvaluateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = np.random.RandomState(0)
+
+    def test_dice_coefficient(self):
+        pred = self.random.rand(24, 20, 16) >= 0.5
+        truth = self.random.rand(24, 20, 16) >= 0.7
+        for p, t in [(pred, truth),
+                     (pred.astype(np.uint8), truth.astype(int)),
+                     (pred.astype(np.float32), truth.astype(np.float64))]:
+            self.assertAlmostEqual(dice_coefficient(p, t), _dice_reference(p, t))
+
+    def test_dice_coefficient_empty(self):
+        empty = np.zeros((8, 8, 8), dtype=np.uint8)
+        self.assertAlmostEqual(dice_coefficient(empty, empty), 1.0)
+        self.assertAlmostEqual(dice_coefficient(empty, np.ones_like(empty)), _dice_reference(empty, np.ones_like(empty)))
+
+    def test_dice_coefficient_shapes(self):
+        # Predictions keep the model's class axis while the truth doesn't
+        pred = self.random.rand(1, 12, 10, 8) >= 0.5
+        truth = self.random.rand(12, 10, 8) >= 0.5
+        self.assertAlmostEqual(dice_coefficient(pred, truth), _dice_reference(pred, truth))
+
+    def test_to_single_class(self):
+        seg = self.random.rand(12, 10, 8).astype(np.float32)
+        out = to_single_class(seg, threshold=0.5)
+        self.assertEqual(out.dtype, np.uint8)
+        np.testing.assert_array_equal(out, _to_single_class_reference(seg, 0.5))
+
+    def test_to_single_class_strided(self):
+        seg = self.random.rand(12, 10, 8)
+        view = seg[::2, 3, ::-3]
+        out = to_single_class(view, threshold=0.5)
+        self.assertEqual(out.dtype, np.uint8)
+        self.assertEqual(out.shape, view.shape)
+        np.testing.assert_array_equal(out, _to_single_class_reference(view, 0.5))
+
+    def test_to_single_class_threshold(self):
+        seg = np.array([0.0, 0.49, 0.5, 0.51, 1.0])
+        np.testing.assert_array_equal(to_single_class(seg, threshold=0.5), [0, 0, 1, 1, 1])
+
+    def test_get_tumor_range(self):
+        seg = np.zeros((10, 8, 6))
+        seg[2:4, 1:3, 1] = 1
+        seg[5, 5, 4] = 4
+        tumor_range, weights = get_tumor_range(Patient("test", seg=seg))
+
+        expected_range, expected_weights = _tumor_range_reference(seg)
+        np.testing.assert_array_equal(tumor_range, expected_range)
+        np.testing.assert_array_equal(weights, expected_weights)
+
+    def test_get_tumor_range_no_tumor(self):
+        seg = np.zeros((10, 8, 6))
+        tumor_range, weights = get_tumor_range(Patient("test", seg=seg))
+
+        expected_range, expected_weights = _tumor_range_reference(seg)
+        self.assertEqual(len(tumor_range), len(expected_range))
+        self.assertEqual(len(weights), len(expected_weights))
+
+    def test_batches(self):
+        self.assertEqual(list(_batches(range(7), 3)), [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(list(_batches(range(6), 3)), [[0, 1, 2], [3, 4, 5]])
+        self.assertEqual(list(_batches(iter(range(2)), 1)), [[0], [1]])
+        self.assertEqual(list(_batches([], 3)), [])
+
+    def test_split_cores(self):
+        if hasattr(os, "sched_getaffinity"):
+            cores = sorted(os.sched_getaffinity(0))
+        else:
+            cores = list(range(os.cpu_count()))
+
+        for num_workers in [1, 2, 3, len(cores) + 1]:
+            core_sets = _split_cores(num_workers)
+            self.assertEqual(len(core_sets), min(num_workers, len(cores)))
+            self.assertTrue(all(len(core_set) > 0 for core_set in core_sets))
+            self.assertEqual(sorted(sum(core_sets, [])), cores)
+
+
+if __name__ == "__main__":
+    unittest.main()